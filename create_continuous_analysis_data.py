@@ -3,11 +3,12 @@ Create continuous (non-binned) analysis_data_set from raw data.
 This script processes all raw data files without 5-year binning, using individual years instead.
 """
 
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
 
-def build_hazard_impact_continuous(df, hazard_name, min_events=1):
+def aggregate_hazard_continuous(df, min_events=1):
     """
     no binning
     Required columns:
@@ -32,22 +33,38 @@ def build_hazard_impact_continuous(df, hazard_name, min_events=1):
     )
     
     # Filter by minimum events
-    agg = agg[agg["events"] >= min_events]
-    
-    # LOG TRANSFORM (reduce skew)
-    agg["affected_log"] = np.log1p(agg["affected"])
-    agg["death_log"] = np.log1p(agg["death"])
+    return agg[agg["events"] >= min_events]
+
+
+def build_hazard_impacts_continuous(hazard_aggs):
+    """
+    Score every hazard in one vectorized pass.
+    hazard_aggs maps hazard name -> output of aggregate_hazard_continuous.
+    The hazards are stacked into NaN-padded (hazard, row) arrays so log1p,
+    mean, std and the summed z-score run once over all of them.
+    """
+    names = list(hazard_aggs)
+    lengths = [len(hazard_aggs[name]) for name in names]
+    affected = np.full((len(names), max(lengths)), np.nan)
+    death = np.full((len(names), max(lengths)), np.nan)
+    for h, name in enumerate(names):
+        affected[h, :lengths[h]] = hazard_aggs[name]["affected"].to_numpy(dtype=np.float64)
+        death[h, :lengths[h]] = hazard_aggs[name]["death"].to_numpy(dtype=np.float64)
     
-    # STANDARDIZE (z-score) - fit on all data
-    scaler = StandardScaler()
-    agg[["affected_z", "death_z"]] = scaler.fit_transform(
-        agg[["affected_log", "death_log"]]
-    )
+    # LOG TRANSFORM (reduce skew) + STANDARDIZE (z-score per hazard, fit on all data, NaN-aware)
+    def zscore(values):
+        std = np.nanstd(values, axis=1, keepdims=True)
+        return (values - np.nanmean(values, axis=1, keepdims=True)) / np.where(std == 0, 1, std)
     
     # FINAL IMPACT SCORE
-    agg[f"{hazard_name}_impact"] = agg["affected_z"] + agg["death_z"]
+    impact = zscore(np.log1p(affected)) + zscore(np.log1p(death))
     
-    return agg[["country", "period", f"{hazard_name}_impact"]]
+    impacts = {}
+    for h, name in enumerate(names):
+        agg = hazard_aggs[name][["country", "period"]].copy()
+        agg[f"{name}_impact"] = impact[h, :lengths[h]]
+        impacts[name] = agg
+    return impacts
 
 
 def build_hazard_total_continuous(df, hazard_name, min_events=1):
@@ -60,19 +77,27 @@ def build_hazard_total_continuous(df, hazard_name, min_events=1):
     df = df.copy()
     
     df = df.dropna(subset=["affected", "death"], how="all")
+    df = df.dropna(subset=["country", "year"])
     df = df.sort_values(["country", "year"])
     
-    df["period"] = df["year"]
+    # Rows are sorted by (country, year), so each group is a contiguous run:
+    # sum both columns with one reduceat over the run starts instead of a hash groupby
+    country = df["country"].to_numpy()
+    year = df["year"].to_numpy()
+    boundaries = np.flatnonzero((country[1:] != country[:-1]) | (year[1:] != year[:-1])) + 1
+    starts = np.r_[0, boundaries] if len(df) else np.array([], dtype=np.intp)
     
-    agg = (
-        df.groupby(["country", "period"])
-          .agg(
-              events=("year", "count"),
-              total_deaths=("death", "sum"),
-              total_affected=("affected", "sum")
-          )
-          .reset_index()
-    )
+    def run_sums(col):
+        values = np.nan_to_num(df[col].to_numpy(dtype=np.float64))
+        return np.add.reduceat(values, starts) if len(starts) else values
+    
+    agg = pd.DataFrame({
+        "country": country[starts],
+        "period": year[starts],
+        "events": np.diff(np.r_[starts, len(df)]),
+        "total_deaths": run_sums("death"),
+        "total_affected": run_sums("affected"),
+    })
     
     agg = agg[agg["events"] >= min_events]
     
@@ -84,6 +109,107 @@ def build_hazard_total_continuous(df, hazard_name, min_events=1):
     return agg[["country", "period", f"{hazard_name}_total_affected", f"{hazard_name}_total_deaths"]]
 
 
+def read_hazard(aff_path, aff_col, death_path, death_col, country_col, year_col):
+    """
+    Read one hazard's affected and death files and outer-join them.
+    Returns columns: country | year | affected | death
+    """
+    columns = {country_col: 'country', year_col: 'year'}
+    aff = pd.read_csv(
+        aff_path,
+        engine='pyarrow',
+        usecols=[country_col, year_col, aff_col],
+        dtype={country_col: str, year_col: 'int64', aff_col: 'float64'}
+    ).rename(columns={**columns, aff_col: 'affected'})
+    death = pd.read_csv(
+        death_path,
+        engine='pyarrow',
+        usecols=[country_col, year_col, death_col],
+        dtype={country_col: str, year_col: 'int64', death_col: 'float64'}
+    ).rename(columns={**columns, death_col: 'death'})
+    return pd.merge(aff, death, on=['country', 'year'], how='outer')
+
+
+def process_impact_hazard(config):
+    hazard_name, aff_path, aff_col, death_path, death_col = config
+    print(f"  - Processing {hazard_name.replace('_', ' ')} data...")
+    hazard_df = read_hazard(aff_path, aff_col, death_path, death_col, 'Country name', 'Year')
+    return hazard_name, aggregate_hazard_continuous(hazard_df)
+
+
+def process_total_hazard(config):
+    hazard_name, aff_path, aff_col, death_path, death_col = config
+    print(f"  - Processing {hazard_name.replace('_', ' ')} totals...")
+    hazard_df = read_hazard(aff_path, aff_col, death_path, death_col, 'country', 'year')
+    return hazard_name, build_hazard_total_continuous(hazard_df, hazard_name)
+
+
+def outer_join_on_keys(frames, keys=("country", "period")):
+    """
+    Outer-join frames on (country, period) in one pass: reindex each frame
+    to the union of their keys and concatenate column-wise.
+    """
+    # set_index reads a tuple as one column label, so pass the keys as a list
+    frames = [f.set_index(list(keys)) for f in frames]
+    union_index = frames[0].index
+    for f in frames[1:]:
+        union_index = union_index.union(f.index)
+    return pd.concat([f.reindex(union_index) for f in frames], axis=1).reset_index()
+
+
+def write_parquet(df, path):
+    """
+    Write a processed dataset as zstd-compressed Parquet with compact dtypes:
+    country as category, period as int16, float columns as float32.
+    """
+    df = df.copy()
+    df["country"] = df["country"].astype("category")
+    df["period"] = df["period"].astype("int16")
+    float_cols = df.select_dtypes(include="float64").columns
+    df[float_cols] = df[float_cols].astype("float32")
+    df.to_parquet(path, index=False, compression="zstd")
+
+
+# (hazard, affected path, affected column, death path, death column)
+PER_CAPITA_HAZARDS = [
+    ("drought",
+     'data/raw/per_100k/total-affected-by-drought/affected.csv',
+     'Total number of people affected by drought per 100,000',
+     'data/raw/per_100k/death-rate-from-drought/death.csv',
+     'Death rates from drought'),
+    ("flood",
+     'data/raw/per_100k/total-affected-by-floods/affected.csv',
+     'Total number of people affected by floods per 100,000',
+     'data/raw/per_100k/death-rate-from-floods/death.csv',
+     'Death rates from floods'),
+    ("storms",
+     'data/raw/per_100k/total-affected-by-storms/affected.csv',
+     'Total number of people affected by storms per 100,000',
+     'data/raw/per_100k/death-rate-from-storms/death.csv',
+     'Death rates from storms'),
+    ("extreme_temp",
+     'data/raw/per_100k/total-affected-by-extreme-temperatures/affected.csv',
+     'Total number of people affected by extreme temperatures per 100,000',
+     'data/raw/per_100k/death-rate-from-extreme-temperatures/death.csv',
+     'Death rates from extreme temperatures'),
+]
+
+TOTAL_HAZARDS = [
+    ("drought",
+     'data/raw/total_count/total-affected-by-drought/affected.csv', 'total_affected_drought',
+     'data/raw/total_count/deaths-from-drought/deaths.csv', 'deaths_drought'),
+    ("flood",
+     'data/raw/total_count/total-affected-by-floods/affected.csv', 'total_affected_flood',
+     'data/raw/total_count/deaths-from-floods/deaths.csv', 'deaths_flood'),
+    ("storm",
+     'data/raw/total_count/total-affected-by-storms/affected.csv', 'total_affected_storm',
+     'data/raw/total_count/deaths-from-storms/deaths.csv', 'deaths_storm'),
+    ("extreme_temp",
+     'data/raw/total_count/total-affected-by-extreme-temperatures/affected.csv', 'total_affected_temperature',
+     'data/raw/total_count/deaths-from-extreme-temperatures/deaths.csv', 'deaths_temperature'),
+]
+
+
 print("=" * 60)
 print("Creating Continuous (Non-Binned) Analysis Dataset")
 print("=" * 60)
@@ -91,82 +217,19 @@ print("=" * 60)
 # PART 1: Process per-capita impact data (for final_data)
 print("\n[1/4] Processing per-capita impact data...")
 
-# Drought
-print("  - Processing drought data...")
-drought_aff = pd.read_csv('data/raw/per_100k/total-affected-by-drought/affected.csv')
-drought_death = pd.read_csv('data/raw/per_100k/death-rate-from-drought/death.csv')
-drought_aff.rename(columns={
-    'Country name': 'country',
-    'Year': 'year',
-    'Total number of people affected by drought per 100,000': 'affected'
-}, inplace=True)
-drought_death.rename(columns={
-    'Country name': 'country',
-    'Year': 'year',
-    'Death rates from drought': 'death'
-}, inplace=True)
-drought_df = pd.merge(drought_aff, drought_death, on=['country', 'year'], how='outer')
-drought_final = build_hazard_impact_continuous(drought_df, "drought")
-
-# Flood
-print("  - Processing flood data...")
-flood_aff = pd.read_csv('data/raw/per_100k/total-affected-by-floods/affected.csv')
-flood_death = pd.read_csv('data/raw/per_100k/death-rate-from-floods/death.csv')
-flood_aff.rename(columns={
-    'Country name': 'country',
-    'Year': 'year',
-    'Total number of people affected by floods per 100,000': 'affected'
-}, inplace=True)
-flood_death.rename(columns={
-    'Country name': 'country',
-    'Year': 'year',
-    'Death rates from floods': 'death'
-}, inplace=True)
-flood_df = pd.merge(flood_aff, flood_death, on=['country', 'year'], how='outer')
-flood_final = build_hazard_impact_continuous(flood_df, "flood")
-
-# Storms
-print("  - Processing storms data...")
-storms_aff = pd.read_csv('data/raw/per_100k/total-affected-by-storms/affected.csv')
-storms_death = pd.read_csv('data/raw/per_100k/death-rate-from-storms/death.csv')
-storms_aff.rename(columns={
-    'Country name': 'country',
-    'Year': 'year',
-    'Total number of people affected by storms per 100,000': 'affected'
-}, inplace=True)
-storms_death.rename(columns={
-    'Country name': 'country',
-    'Year': 'year',
-    'Death rates from storms': 'death'
-}, inplace=True)
-storms_df = pd.merge(storms_aff, storms_death, on=['country', 'year'], how='outer')
-storms_final = build_hazard_impact_continuous(storms_df, "storms")
-
-# Extreme temperatures
-print("  - Processing extreme temperature data...")
-extreme_temp_aff = pd.read_csv('data/raw/per_100k/total-affected-by-extreme-temperatures/affected.csv')
-extreme_temp_death = pd.read_csv('data/raw/per_100k/death-rate-from-extreme-temperatures/death.csv')
-extreme_temp_aff.rename(columns={
-    'Country name': 'country',
-    'Year': 'year',
-    'Total number of people affected by extreme temperatures per 100,000': 'affected'
-}, inplace=True)
-extreme_temp_death.rename(columns={
-    'Country name': 'country',
-    'Year': 'year',
-    'Death rates from extreme temperatures': 'death'
-}, inplace=True)
-extreme_temp_df = pd.merge(extreme_temp_aff, extreme_temp_death, on=['country', 'year'], how='outer')
-extreme_temp_final = build_hazard_impact_continuous(extreme_temp_df, "extreme_temp")
+# The hazards are independent, so read and aggregate them concurrently
+with ThreadPoolExecutor(max_workers=4) as executor:
+    impact_aggs = dict(executor.map(process_impact_hazard, PER_CAPITA_HAZARDS))
+impact_finals = build_hazard_impacts_continuous(impact_aggs)
 
 # Merge all impact data
 print("  - Merging impact data...")
-final_data_processed = (
-    flood_final
-    .merge(drought_final, on=["country", "period"], how="outer")
-    .merge(storms_final, on=["country", "period"], how="outer")
-    .merge(extreme_temp_final, on=["country", "period"], how="outer")
-)
+final_data_processed = outer_join_on_keys([
+    impact_finals["flood"],
+    impact_finals["drought"],
+    impact_finals["storms"],
+    impact_finals["extreme_temp"],
+])
 
 # Calculate climate impact index
 impact_cols = ["flood_impact", "drought_impact", "storms_impact", "extreme_temp_impact"]
@@ -182,48 +245,17 @@ print(f"  ✓ Final data shape: {final_data_processed.shape}")
 # PART 2: Process total counts data (for final_total_data)
 print("\n[2/4] Processing total counts data...")
 
-# Drought totals
-print("  - Processing drought totals...")
-drought_aff_total = pd.read_csv('data/raw/total_count/total-affected-by-drought/affected.csv')
-drought_death_total = pd.read_csv('data/raw/total_count/deaths-from-drought/deaths.csv')
-drought_aff_total.rename(columns={'total_affected_drought': 'affected'}, inplace=True)
-drought_death_total.rename(columns={'deaths_drought': 'death'}, inplace=True)
-drought_total_df = pd.merge(drought_aff_total, drought_death_total, on=['country', 'year'], how='outer')
-drought_total_final = build_hazard_total_continuous(drought_total_df, "drought")
-
-# Flood totals
-print("  - Processing flood totals...")
-flood_aff_total = pd.read_csv('data/raw/total_count/total-affected-by-floods/affected.csv')
-flood_death_total = pd.read_csv('data/raw/total_count/deaths-from-floods/deaths.csv')
-flood_aff_total.rename(columns={'total_affected_flood': 'affected'}, inplace=True)
-flood_death_total.rename(columns={'deaths_flood': 'death'}, inplace=True)
-flood_total_df = pd.merge(flood_aff_total, flood_death_total, on=['country', 'year'], how='outer')
-flood_total_final = build_hazard_total_continuous(flood_total_df, "flood")
-
-# Storm totals
-print("  - Processing storm totals...")
-storm_aff_total = pd.read_csv('data/raw/total_count/total-affected-by-storms/affected.csv')
-storm_death_total = pd.read_csv('data/raw/total_count/deaths-from-storms/deaths.csv')
-storm_aff_total.rename(columns={'total_affected_storm': 'affected'}, inplace=True)
-storm_death_total.rename(columns={'deaths_storm': 'death'}, inplace=True)
-storm_total_df = pd.merge(storm_aff_total, storm_death_total, on=['country', 'year'], how='outer')
-storm_total_final = build_hazard_total_continuous(storm_total_df, "storm")
-
-# Extreme temp totals
-print("  - Processing extreme temperature totals...")
-extreme_temp_aff_total = pd.read_csv('data/raw/total_count/total-affected-by-extreme-temperatures/affected.csv')
-extreme_temp_death_total = pd.read_csv('data/raw/total_count/deaths-from-extreme-temperatures/deaths.csv')
-extreme_temp_aff_total.rename(columns={'total_affected_temperature': 'affected'}, inplace=True)
-extreme_temp_death_total.rename(columns={'deaths_temperature': 'death'}, inplace=True)
-extreme_temp_total_df = pd.merge(extreme_temp_aff_total, extreme_temp_death_total, on=['country', 'year'], how='outer')
-extreme_temp_total_final = build_hazard_total_continuous(extreme_temp_total_df, "extreme_temp")
+with ThreadPoolExecutor(max_workers=4) as executor:
+    total_finals = dict(executor.map(process_total_hazard, TOTAL_HAZARDS))
 
 # Merge all total data
 print("  - Merging total data...")
-final_total_processed = extreme_temp_total_final.copy()
-final_total_processed = final_total_processed.merge(drought_total_final, on=['country', 'period'], how='outer')
-final_total_processed = final_total_processed.merge(flood_total_final, on=['country', 'period'], how='outer')
-final_total_processed = final_total_processed.merge(storm_total_final, on=['country', 'period'], how='outer')
+final_total_processed = outer_join_on_keys([
+    total_finals['extreme_temp'],
+    total_finals['drought'],
+    total_finals['flood'],
+    total_finals['storm'],
+])
 
 # Fill NaN with 0
 final_total_processed = final_total_processed.fillna(0)
@@ -248,31 +280,18 @@ print(f"  ✓ Final total data shape: {final_total_processed.shape}")
 # PART 3: Process economic damage data (without binning)
 print("\n[3/4] Processing economic damage data...")
 
-economic_damage = pd.read_csv('data/raw/total_count/economic-damages-from-disasters/economic_damage.csv')
-
-# Melt to long format
-economic_long = economic_damage.melt(
-    id_vars=['Entity', 'Code', 'Year'],
-    value_vars=['drought', 'flood', 'storm', 'extreme_temp'],
-    var_name='hazard',
-    value_name='economic_damage_pct_gdp'
+economic_damage = pd.read_csv(
+    'data/raw/total_count/economic-damages-from-disasters/economic_damage.csv',
+    engine='pyarrow'
 )
 
-# Use Year directly as period (no binning)
-economic_long['period'] = economic_long['Year']
-economic_long['country'] = economic_long['Entity']
-
-# Aggregate economic damage to country-year using mean across hazards
+# Average economic damage across hazards row-wise (each row is one country-year; no binning)
 hazard_cols = ['drought', 'flood', 'storm', 'extreme_temp']
-economic_agg = (
-    economic_long
-    .groupby(['country', 'period'])['economic_damage_pct_gdp']
-    .mean()
-    .reset_index()
-    .rename(columns={'economic_damage_pct_gdp': 'economic_damage_pct_gdp'})
-)
+economic_damage['economic_damage_pct_gdp'] = economic_damage[hazard_cols].mean(axis=1)
 
-economic_processed = economic_agg[['country', 'period', 'economic_damage_pct_gdp']].copy()
+economic_processed = economic_damage.rename(columns={'Entity': 'country', 'Year': 'period'})[
+    ['country', 'period', 'economic_damage_pct_gdp']
+]
 print(f"  ✓ Economic data shape: {economic_processed.shape}")
 
 
@@ -322,6 +341,10 @@ analysis_data_set = analysis_data_set.sort_values(['country', 'period']).reset_i
 output_path = 'data/processed/analysis_data_set_continuous.csv'
 analysis_data_set.to_csv(output_path, index=False)
 
+# Parquet copies of the datasets loaded by the Streamlit app
+for processed_path in ['data/processed/analysis_data_set.csv', 'data/processed/final_total_data.csv']:
+    write_parquet(pd.read_csv(processed_path, engine='pyarrow'), processed_path.replace('.csv', '.parquet'))
+
 print(f"\n{'='*60}")
 print(f"✓ Continuous analysis dataset created successfully!")
 print(f"{'='*60}")
@@ -1,10 +1,93 @@
+import argparse
+import hashlib
+import json
+import os
+
 import pandas as pd
 import numpy as np
 
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error, r2_score
 from sklearn.model_selection import RandomizedSearchCV
-from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.ensemble import HistGradientBoostingRegressor
+
+from ml_model_cont_improved import N_JOBS, as_model_input, country_train_mean
+
+HPARAMS_PATH = "data/processed/model_hparams.json"
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--tune", action="store_true",
+                    help="rerun the hyperparameter searches even if saved params match the training data")
+args = parser.parse_args()
+
+
+def training_key(X, y, param_grid):
+    """Hash of the training set and search space the saved params were tuned on"""
+    h = hashlib.md5()
+    h.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+    h.update(pd.util.hash_pandas_object(y, index=False).values.tobytes())
+    h.update(json.dumps(param_grid, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def tuned_model(estimator, param_grid, X, y, tune=False):
+    """
+    Return the estimator fitted with its best hyperparameters.
+    The RandomizedSearchCV result is saved to HPARAMS_PATH and reused while
+    the training data and grid are unchanged, unless tune is set.
+    """
+    name = type(estimator).__name__
+    key = training_key(X, y, param_grid)
+    X, y = as_model_input(X), y.to_numpy()
+    saved = {}
+    if os.path.exists(HPARAMS_PATH):
+        with open(HPARAMS_PATH) as f:
+            saved = json.load(f)
+    
+    if not tune and saved.get(name, {}).get("key") == key:
+        best_params = saved[name]["params"]
+        print("Best params (saved):", best_params)
+        print("Best CV R²:", saved[name]["cv_r2"])
+        if "n_jobs" in estimator.get_params():
+            # a single fit with no outer search can use every core
+            best_params = {**best_params, "n_jobs": N_JOBS}
+        return estimator.set_params(**best_params).fit(X, y)
+    
+    search = RandomizedSearchCV(
+        estimator,
+        param_distributions=param_grid,
+        n_iter=20,              # keep small
+        scoring="r2",
+        cv=3,                   # simple CV
+        random_state=42,
+        n_jobs=N_JOBS
+    )
+    search.fit(X, y)
+    print("Best params:", search.best_params_)
+    print("Best CV R²:", search.best_score_)
+    
+    saved[name] = {"key": key, "params": search.best_params_, "cv_r2": search.best_score_}
+    with open(HPARAMS_PATH, "w") as f:
+        json.dump(saved, f, indent=2)
+    return search.best_estimator_
+
+
+def grouped_shift(df, col, k):
+    """
+    Equivalent of df.groupby("country")[col].shift(k) for a frame already
+    sorted by country: one np.roll, then blank the rows whose source row
+    belongs to another country (or wrapped around the array).
+    """
+    codes = pd.factorize(df["country"])[0]
+    shifted = np.roll(df[col].to_numpy(dtype=np.float64), k)
+    crosses_group = (np.roll(codes, k) != codes) | (codes == -1)
+    if k > 0:
+        crosses_group[:k] = True
+    elif k < 0:
+        crosses_group[k:] = True
+    shifted[crosses_group] = np.nan
+    return shifted
+
 
 df = pd.read_csv("data/processed/analysis_data_set.csv")
 
@@ -12,34 +95,23 @@ print(df.shape)
 
 df = df.sort_values(["country", "period"])
 
-df["impact_rebased_next"] = (
-    df.groupby("country")["impact_rebased"].shift(-1)
+df["impact_rebased_next"] = grouped_shift(df, "impact_rebased", -1)
+
+# per-country mean over the training years (before 2015),
+# with the overall training mean as fallback for unseen / missing
+codes, countries = pd.factorize(df["country"])
+df["country_mean_impact"] = country_train_mean(
+    codes, len(countries), df["impact_rebased"].to_numpy(dtype=np.float64), (df["period"] < 2015).to_numpy()
 )
 
 # spliting data
 train_df = df[df["period"] < 2015].copy()
 test_df = df[df["period"] >= 2015].copy()
 
-country_mean = (
-    train_df.groupby("country")["impact_rebased"].mean()
-)
-
-train_df["country_mean_impact"] = train_df["country"].map(country_mean)
-test_df["country_mean_impact"] = test_df["country"].map(country_mean)
-
-# fallback for unseen / missing
-global_mean = train_df["impact_rebased"].mean()
-train_df["country_mean_impact"].fillna(global_mean, inplace=True)
-test_df["country_mean_impact"].fillna(global_mean, inplace=True)
-
 
 #adding lag features
-train_df["impact_lag1"] = (
-    train_df.groupby("country")["impact_rebased"].shift(1)
-)
-test_df["impact_lag1"] = (
-    test_df.groupby("country")["impact_rebased"].shift(1)
-)
+train_df["impact_lag1"] = grouped_shift(train_df, "impact_rebased", 1)
+test_df["impact_lag1"] = grouped_shift(test_df, "impact_rebased", 1)
 
 FEATURES = [
     "country_mean_impact",
@@ -58,7 +130,7 @@ train_df = train_df.dropna(subset=FEATURES + [TARGET])
 test_df  = test_df.dropna(subset=FEATURES + [TARGET])
 X_train = train_df[FEATURES]
 y_train = train_df[TARGET]
-X_test = test_df[FEATURES]
+X_test = as_model_input(test_df[FEATURES])
 y_test = test_df[TARGET]
 
 #random forest model
@@ -73,23 +145,11 @@ param_grid = {
 
 rf = RandomForestRegressor(
     random_state=42,
-    n_jobs=-1
+    n_jobs=1
 )
 
-search = RandomizedSearchCV(
-    rf,
-    param_distributions=param_grid,
-    n_iter=20,              # keep small
-    scoring="r2",
-    cv=3,                   # simple CV
-    random_state=42,
-    n_jobs=-1
-)
-search.fit(X_train, y_train)
-best_model = search.best_estimator_
 print("Random Forest Model")
-print("Best params:", search.best_params_)
-print("Best CV R²:", search.best_score_)
+best_model = tuned_model(rf, param_grid, X_train, y_train, tune=args.tune)
 
 
 y_pred = best_model.predict(X_test)
@@ -98,34 +158,21 @@ r2 = r2_score(y_test, y_pred)
 print("RMSE:", rmse)
 print("R²:", r2)
 
-#Gradientboostingregressor model -> bad R2: only 0.188
+#HistGradientBoostingRegressor model (binned split finding, replaces GradientBoostingRegressor)
 param_grid = {
-    "n_estimators": [100, 200, 300],
+    "max_iter": [100, 200, 300],
     "learning_rate": [0.05, 0.1, 0.2],
-    "max_depth": [2, 3, 4],
-    "min_samples_split": [2, 5, 10],
-    "min_samples_leaf": [1, 3, 5],
-    "subsample": [0.6, 0.8, 1.0]
+    "max_depth": [2, 3, 4, None],
+    "l2_regularization": [0.0, 0.1, 1.0],
+    "max_bins": [63, 127, 255]
 }
 
-gbr = GradientBoostingRegressor(
+gbr = HistGradientBoostingRegressor(
     random_state=42
-) 
-
-search = RandomizedSearchCV(
-    gbr,
-    param_distributions=param_grid,
-    n_iter=20,
-    scoring="r2",
-    cv=3,
-    random_state=42,
-    n_jobs=-1
 )
-search.fit(X_train, y_train)
-best_model = search.best_estimator_
-print("Gradient Boosting Regressor Model")
-print("Best params:", search.best_params_) 
-print("Best CV R²:", search.best_score_)
+
+print("Hist Gradient Boosting Regressor Model")
+best_model = tuned_model(gbr, param_grid, X_train, y_train, tune=args.tune)
 
 y_pred = best_model.predict(X_test)
 rmse = np.sqrt(mean_squared_error(y_test, y_pred))
@@ -4,7 +4,36 @@ import plotly.express as px
 import plotly.graph_objects as go
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import RandomizedSearchCV
+import functools
+import hashlib
+import json
 import os
+from joblib import cpu_count, dump, load
+from numba import njit
+
+DATA_PATH = "data/processed/analysis_data_set_continuous.csv"
+MODEL_CACHE_DIR = "data/processed/model_cache"
+FEATURES_PATH = os.path.join(MODEL_CACHE_DIR, "features.parquet")
+# Bump when build_features or the helpers it calls change, so cached features are rebuilt
+FEATURES_VERSION = 1
+# Searches parallelize over fits; estimators stay single-threaded so the two don't oversubscribe
+N_JOBS = cpu_count(only_physical_cores=True)
+
+
+def load_raw(path=DATA_PATH):
+    """
+    The continuous analysis data, shared by the model scripts, so callers
+    must not modify it in place. country is categorical so groupbys work
+    on integer codes.
+    """
+    stat = os.stat(path)
+    return _read_raw(path, stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=1)
+def _read_raw(path, mtime_ns, size):
+    """Read once per file state: mtime and size are part of the key, so a rewritten CSV is read again"""
+    return pd.read_csv(path, dtype={"country": "category"}, engine="pyarrow")
 
 
 def filter_valid_countries(df):
@@ -18,19 +47,116 @@ def filter_valid_countries(df):
     return df[~df['country'].isin(invalid_countries)].copy()
 
 
-def calculate_trend_5yr(series):
-    result = []
-    for i in range(len(series)):
-        start_idx = max(0, i - 4)
-        window = series.iloc[start_idx:i+1].values
-        valid_window = window[~np.isnan(window)]
-        if len(valid_window) >= 2:
-            x = np.arange(len(valid_window))
-            trend = np.polyfit(x, valid_window, 1)[0]
-            result.append(trend)
+@njit(cache=True)
+def _trend5_grouped(codes, values, out):
+    for i in range(len(values)):
+        n = 0
+        sum_x = 0.0
+        sum_y = 0.0
+        sum_xy = 0.0
+        sum_xx = 0.0
+        j = i - 4 if i >= 4 else 0
+        while j <= i:
+            # only look back within the current country
+            if codes[j] == codes[i] and not np.isnan(values[j]):
+                sum_x += n
+                sum_y += values[j]
+                sum_xy += n * values[j]
+                sum_xx += n * n
+                n += 1
+            j += 1
+        if n >= 2:
+            out[i] = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x * sum_x)
+        else:
+            out[i] = 0.0
+
+
+def trend_5yr_grouped(df, col):
+    """
+    Slope of a least-squares line through the non-NaN values of each
+    trailing 5-row window within a country, with x = 0..n-1 over the valid
+    values; 0 when fewer than 2. df must be sorted by country then period.
+    """
+    codes = pd.factorize(df["country"])[0]
+    out = np.empty(len(df))
+    _trend5_grouped(codes, df[col].to_numpy(dtype=np.float64), out)
+    out[codes == -1] = np.nan
+    return out
+
+
+ROLLING_COLS = ["total_affected_3yr_avg", "total_death_3yr_avg", "impact_3yr_avg", "impact_std_5yr"]
+
+@njit(cache=True)
+def _rolling_grouped(codes, affected, deaths, climate, out):
+    for i in range(len(codes)):
+        # first row of the trailing 5-row window that belongs to the current country
+        start = i - 4 if i >= 4 else 0
+        while codes[start] != codes[i]:
+            start += 1
+
+        # 3-row means of the three inputs, skipping NaNs
+        sums = np.zeros(3)
+        counts = np.zeros(3)
+        for j in range(max(start, i - 2), i + 1):
+            for k, values in enumerate((affected, deaths, climate)):
+                if not np.isnan(values[j]):
+                    sums[k] += values[j]
+                    counts[k] += 1
+        for k in range(3):
+            out[i, k] = sums[k] / counts[k] if counts[k] > 0 else np.nan
+
+        # 5-row sample std of climate, NaN below two values
+        n = 0
+        total = 0.0
+        for j in range(start, i + 1):
+            if not np.isnan(climate[j]):
+                total += climate[j]
+                n += 1
+        if n >= 2:
+            mean = total / n
+            sq = 0.0
+            for j in range(start, i + 1):
+                if not np.isnan(climate[j]):
+                    sq += (climate[j] - mean) ** 2
+            out[i, 3] = np.sqrt(sq / (n - 1))
         else:
-            result.append(0.0)
-    return pd.Series(result, index=series.index)
+            out[i, 3] = np.nan
+
+
+def rolling_grouped(df):
+    """
+    Per-country trailing 3-row means of total_affected, total_deaths and
+    climate_impact_index and the 5-row std of climate_impact_index, as
+    ROLLING_COLS; df must be sorted by country then period
+    """
+    codes = pd.factorize(df["country"])[0]
+    out = np.empty((len(df), len(ROLLING_COLS)))
+    _rolling_grouped(
+        codes,
+        df["total_affected"].to_numpy(dtype=np.float64),
+        df["total_deaths"].to_numpy(dtype=np.float64),
+        df["climate_impact_index"].to_numpy(dtype=np.float64),
+        out
+    )
+    out[codes == -1] = np.nan
+    return pd.DataFrame(out, index=df.index, columns=ROLLING_COLS)
+
+
+# Rank bands of the CLI map, shared with the app's severity map
+RISK_BINS = np.array([0, 10, 20, 50, 100, np.iinfo(np.int64).max])
+RISK_LABELS = np.array(["1-10", "11-20", "21-50", "51-100", ">100"])
+RISK_COLORS = {
+    "1-10": "#8B0000",
+    "11-20": "#CC0000",
+    "21-50": "#FF4444",
+    "51-100": "#FF9999",
+    ">100": "#FFCCCC"
+}
+
+
+def risk_category(rank):
+    """RISK_LABELS band of each dense rank (1 = highest)"""
+    return RISK_LABELS[np.searchsorted(RISK_BINS, np.asarray(rank), side="left") - 1]
 
 
 def create_cli_map(pred_df):
@@ -45,7 +171,6 @@ def create_cli_map(pred_df):
         fig.update_layout(title=None, margin=dict(l=0, r=0, t=0, b=0))
         return fig, pred_df
     
-    pred_df = pred_df.copy()
     pred_df = pred_df[pred_df["CLI"].notna()].copy()
     
     if pred_df.empty:
@@ -61,27 +186,7 @@ def create_cli_map(pred_df):
     
     pred_df["CLI_rank"] = pred_df["CLI"].rank(method='dense', ascending=False).astype(int)
     
-    def get_risk_category(rank):
-        if rank <= 10:
-            return "1-10"
-        elif rank <= 20:
-            return "11-20"
-        elif rank <= 50:
-            return "21-50"
-        elif rank <= 100:
-            return "51-100"
-        else:
-            return ">100"
-    
-    pred_df["risk_category"] = pred_df["CLI_rank"].apply(get_risk_category)
-    
-    category_colors = {
-        "1-10": "#8B0000",
-        "11-20": "#CC0000",
-        "21-50": "#FF4444",
-        "51-100": "#FF9999",
-        ">100": "#FFCCCC"
-    }
+    pred_df["risk_category"] = risk_category(pred_df["CLI_rank"])
     
     fig = px.choropleth(
         pred_df,
@@ -93,8 +198,8 @@ def create_cli_map(pred_df):
             "CLI_rank": True,
             "CLI": ":.3f"
         },
-        color_discrete_map=category_colors,
-        category_orders={"risk_category": ["1-10", "11-20", "21-50", "51-100", ">100"]},
+        color_discrete_map=RISK_COLORS,
+        category_orders={"risk_category": RISK_LABELS.tolist()},
         labels={"risk_category": "Risk Category"}
     )
     
@@ -125,85 +230,152 @@ def create_cli_map(pred_df):
     return fig, pred_df
 
 
-def _train_and_predict():
-    df = pd.read_csv("data/processed/analysis_data_set_continuous.csv")
+HUMAN_BURDEN_COLS = ["log_total_affected", "log_total_death", "log_total_affected_3yr_avg", "log_total_death_3yr_avg"]
+PERSISTENCE_COLS = ["impact_3yr_avg", "impact_lag1"]
+# column i of the packed matrix feeds component j where the entry is 1
+ROW_MEAN_GROUPS = np.array([[1.0, 0.0]] * len(HUMAN_BURDEN_COLS) + [[0.0, 1.0]] * len(PERSISTENCE_COLS))
+
+
+def burden_persistence(frame):
+    """
+    human_burden and persistence row means as two matmuls over the packed
+    columns: sums of the valid values and their counts, so NaNs are
+    skipped as in DataFrame.mean(axis=1).
+    """
+    values = frame[HUMAN_BURDEN_COLS + PERSISTENCE_COLS].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = (np.where(valid, values, 0.0) @ ROW_MEAN_GROUPS) / (valid @ ROW_MEAN_GROUPS)
+    return pd.DataFrame(means, index=frame.index, columns=["human_burden", "persistence"])
+
+
+def cli_stats(train_df):
+    """(mean, std) of each CLI component over the training years"""
+    components = burden_persistence(train_df).assign(
+        climate_intensity=train_df["climate_impact_index"],
+        structural_vulnerability=train_df["country_mean_impact"],
+    )
+    stats = components.agg(["mean", "std"])
+    return {name: (stats.at["mean", name], stats.at["std", name] or 1) for name in components.columns}
+
+
+def standardize_cli(frame, stats):
+    """Add the four standardized CLI components and the weighted CLI to frame in place"""
+    row_means = burden_persistence(frame)
+    components = {
+        "human_burden": row_means["human_burden"],
+        "persistence": row_means["persistence"],
+        "climate_intensity": frame["climate_impact_index"],
+        "structural_vulnerability": frame["country_mean_impact"],
+    }
+    for name, values in components.items():
+        mean, std = stats[name]
+        frame[name] = (values - mean) / std
+
+    frame["CLI"] = (
+        0.50 * frame["human_burden"] +
+        0.25 * frame["persistence"] +
+        0.15 * frame["climate_intensity"] +
+        0.10 * frame["structural_vulnerability"]
+    )
+
+
+def country_train_mean(codes, n_countries, values, is_train):
+    """
+    Mean of values over the training rows of each country, gathered for
+    every row by its factorized country code. Per-country sums and counts
+    come from np.bincount; countries with no training value get the
+    overall training mean.
+    """
+    valid = is_train & ~np.isnan(values)
+    known = valid & (codes >= 0)
+    sums = np.bincount(codes[known], weights=values[known], minlength=n_countries)
+    counts = np.bincount(codes[known], minlength=n_countries)
+    # one extra slot so code -1 (missing country) also gathers the overall mean
+    mean_by_code = np.full(n_countries + 1, values[valid].mean())
+    has_values = np.flatnonzero(counts)
+    mean_by_code[has_values] = sums[has_values] / counts[has_values]
+    return mean_by_code[codes]
+
+
+def build_features(df):
+    """
+    Engineer the model features and CLI components from the raw analysis
+    data; returns the frame and the CLI stats it was standardized with
+    """
     df = filter_valid_countries(df)
     df = df.sort_values(["country", "period"])
 
     df["impact_rebased_next"] = df.groupby("country")["impact_rebased"].shift(-1)
 
-    train_df_temp = df[df["period"] <= 2023].copy()
+    codes, countries = pd.factorize(df["country"])
+    is_train = (df["period"] <= 2023).to_numpy()
     
-    country_mean_impact = train_df_temp.groupby("country")["impact_rebased"].mean()
-    df["country_mean_impact"] = df["country"].map(country_mean_impact)
-    df["country_mean_impact"].fillna(train_df_temp["impact_rebased"].mean(), inplace=True)
+    df["country_mean_impact"] = country_train_mean(
+        codes, len(countries), df["impact_rebased"].to_numpy(dtype=np.float64), is_train
+    )
 
     df["impact_lag1"] = df.groupby("country")["impact_rebased"].shift(1)
-    df["impact_lag1"].fillna(df["country_mean_impact"], inplace=True)
+    df["impact_lag1"] = df["impact_lag1"].fillna(df["country_mean_impact"])
 
     df["log_total_affected"] = np.log1p(df["total_affected"].fillna(0))
     df["log_total_death"] = np.log1p(df["total_deaths"].fillna(0))
 
-    df["total_affected_3yr_avg"] = df.groupby("country")["total_affected"].transform(
-        lambda x: x.rolling(window=3, min_periods=1).mean().fillna(0)
-    )
+    rolling = rolling_grouped(df)
+
+    df["total_affected_3yr_avg"] = rolling["total_affected_3yr_avg"].fillna(0)
     df["log_total_affected_3yr_avg"] = np.log1p(df["total_affected_3yr_avg"])
 
-    df["total_death_3yr_avg"] = df.groupby("country")["total_deaths"].transform(
-        lambda x: x.rolling(window=3, min_periods=1).mean().fillna(0)
-    )
+    df["total_death_3yr_avg"] = rolling["total_death_3yr_avg"].fillna(0)
     df["log_total_death_3yr_avg"] = np.log1p(df["total_death_3yr_avg"])
 
-    df["impact_3yr_avg"] = df.groupby("country")["climate_impact_index"].transform(
-        lambda x: x.rolling(window=3, min_periods=1).mean()
-    )
+    df["impact_3yr_avg"] = rolling["impact_3yr_avg"]
 
-    df["impact_trend_5yr"] = df.groupby("country")["climate_impact_index"].apply(
-        calculate_trend_5yr
-    ).reset_index(level=0, drop=True)
+    df["impact_trend_5yr"] = trend_5yr_grouped(df, "climate_impact_index")
 
-    df["absolute_impact_trend"] = df.groupby("country")["log_total_affected"].apply(
-        calculate_trend_5yr
-    ).reset_index(level=0, drop=True)
+    df["absolute_impact_trend"] = trend_5yr_grouped(df, "log_total_affected")
 
-    df["impact_std_5yr"] = df.groupby("country")["climate_impact_index"].transform(
-        lambda x: x.rolling(window=5, min_periods=1).std().fillna(0)
-    )
+    df["impact_std_5yr"] = rolling["impact_std_5yr"].fillna(0)
 
-    country_long_term_mean = train_df_temp.groupby("country")["climate_impact_index"].mean()
-    df["country_long_term_mean"] = df["country"].map(country_long_term_mean)
-    df["country_long_term_mean"].fillna(train_df_temp["climate_impact_index"].mean(), inplace=True)
+    df["country_long_term_mean"] = country_train_mean(
+        codes, len(countries), df["climate_impact_index"].to_numpy(dtype=np.float64), is_train
+    )
     df["country_recent_deviation"] = df["climate_impact_index"] - df["country_long_term_mean"]
 
-    train_df_temp = df[df["period"] <= 2023].copy()
-
-    human_burden_components = train_df_temp[["log_total_affected", "log_total_death", "log_total_affected_3yr_avg", "log_total_death_3yr_avg"]].mean(axis=1)
-    human_burden_mean = human_burden_components.mean()
-    human_burden_std = human_burden_components.std() or 1
-    df["human_burden"] = (df[["log_total_affected", "log_total_death", "log_total_affected_3yr_avg", "log_total_death_3yr_avg"]].mean(axis=1) - human_burden_mean) / human_burden_std
-
-    persistence_train = train_df_temp[["impact_3yr_avg", "impact_lag1"]].mean(axis=1)
-    persistence_mean = persistence_train.mean()
-    persistence_std = persistence_train.std() or 1
-    df["persistence"] = (df[["impact_3yr_avg", "impact_lag1"]].mean(axis=1) - persistence_mean) / persistence_std
+    stats = cli_stats(df[df["period"] <= 2023])
+    standardize_cli(df, stats)
 
-    climate_intensity_mean = train_df_temp["climate_impact_index"].mean()
-    climate_intensity_std = train_df_temp["climate_impact_index"].std() or 1
-    df["climate_intensity"] = (df["climate_impact_index"] - climate_intensity_mean) / climate_intensity_std
-
-    structural_mean = train_df_temp["country_mean_impact"].mean()
-    structural_std = train_df_temp["country_mean_impact"].std() or 1
-    df["structural_vulnerability"] = (df["country_mean_impact"] - structural_mean) / structural_std
+    df["impact_rebased_next"] = df.groupby("country")["impact_rebased"].shift(-1)
 
-    df["CLI"] = (
-        0.50 * df["human_burden"] +
-        0.25 * df["persistence"] +
-        0.15 * df["climate_intensity"] +
-        0.10 * df["structural_vulnerability"]
-    )
+    return df.reset_index(drop=True), stats
+
+
+def load_features():
+    """
+    Engineered features and their CLI stats, cached as Parquet. A sidecar
+    JSON holds the stats, FEATURES_VERSION and the mtime and size of the
+    CSV they were built from; the cache is rebuilt when any of these change.
+    """
+    stat = os.stat(DATA_PATH)
+    source = {"features_version": FEATURES_VERSION, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    sidecar_path = FEATURES_PATH + ".json"
+    if os.path.exists(FEATURES_PATH) and os.path.exists(sidecar_path):
+        with open(sidecar_path) as f:
+            sidecar = json.load(f)
+        if sidecar["source"] == source:
+            stats = {name: tuple(mean_std) for name, mean_std in sidecar["cli_stats"].items()}
+            return pd.read_parquet(FEATURES_PATH), stats
+    
+    # build from the same file state the sidecar is stamped with
+    df, stats = build_features(_read_raw(DATA_PATH, stat.st_mtime_ns, stat.st_size))
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    df.to_parquet(FEATURES_PATH, index=False)
+    with open(sidecar_path, "w") as f:
+        json.dump({"source": source, "cli_stats": stats}, f)
+    return df, stats
 
-    df["impact_rebased_next"] = df.groupby("country")["impact_rebased"].shift(-1)
 
+def fit_predict(df, stats):
     FEATURES = [
         "flood_impact",
         "drought_impact",
@@ -228,58 +400,36 @@ def _train_and_predict():
     TARGET = "impact_rebased_next"
 
     train_df = df[df["period"] <= 2023].copy()
-    all_countries = train_df['country'].unique()
-    pred_df_list = []
-    
-    for country in all_countries:
-        country_data = df[df['country'] == country].copy()
-        for year in [2025, 2024, 2023, 2022, 2021, 2020]:
-            year_data = country_data[country_data['period'] == year].copy()
-            if not year_data.empty:
-                pred_df_list.append(year_data.iloc[[0]])
-                break
+
+    # latest year in 2020-2025 for each country seen in training (first row if a year repeats)
+    pred_df = (
+        df[df["period"].between(2020, 2025) & df["country"].isin(train_df["country"])]
+        .sort_values(["country", "period"], ascending=[True, False], kind="stable")
+        .drop_duplicates("country")
+        .reset_index(drop=True)
+    )
     
-    if not pred_df_list:
+    if pred_df.empty:
         raise ValueError("No prediction data available")
     
-    pred_df = pd.concat(pred_df_list, ignore_index=True)
-    
     country_years_count = train_df.groupby('country')['period'].nunique()
-    valid_countries = []
-    for country in pred_df['country'].unique():
-        total_years = country_years_count.get(country, 0)
-        if total_years >= 5:
-            valid_countries.append(country)
+    valid_countries = country_years_count.index[country_years_count >= 5]
     
     pred_df = pred_df[pred_df['country'].isin(valid_countries)].copy()
     
     train_df = train_df.dropna(subset=FEATURES + [TARGET])
 
-    for feat in FEATURES:
-        if feat in ['flood_impact', 'drought_impact', 'storms_impact', 'extreme_temp_impact']:
-            pred_df[feat] = pred_df[feat].fillna(0)
-        elif feat == 'climate_impact_index':
-            pred_df[feat] = pred_df[feat].fillna(
-                pred_df[['flood_impact', 'drought_impact', 'storms_impact', 'extreme_temp_impact']].mean(axis=1, skipna=True)
-            )
-            pred_df[feat] = pred_df[feat].fillna(0)
-        elif feat in ['log_total_affected_3yr_avg', 'log_total_death_3yr_avg']:
-            if feat not in pred_df.columns:
-                if feat == 'log_total_affected_3yr_avg':
-                    pred_df[feat] = pred_df['log_total_affected']
-                else:
-                    pred_df[feat] = pred_df['log_total_death']
-            pred_df[feat] = pred_df[feat].fillna(pred_df[feat].median() if pred_df[feat].notna().any() else 0)
-        elif feat == 'absolute_impact_trend':
-            if feat not in pred_df.columns:
-                pred_df[feat] = 0
-            pred_df[feat] = pred_df[feat].fillna(0)
-        else:
-            pred_df[feat] = pred_df[feat].fillna(pred_df[feat].median() if pred_df[feat].notna().any() else 0)
+    hazard_features = ['flood_impact', 'drought_impact', 'storms_impact', 'extreme_temp_impact']
+    # one fillna pass: hazards and the trend default to 0, climate_impact_index to the hazard mean,
+    # everything else to its median (0 when a column is all NaN)
+    fill_values = pred_df[FEATURES].median().fillna(0).to_dict()
+    fill_values.update(dict.fromkeys(hazard_features + ['absolute_impact_trend'], 0))
+    fill_values['climate_impact_index'] = pred_df[hazard_features].fillna(0).mean(axis=1)
+    pred_df = pred_df.fillna(fill_values)
 
-    X_train = train_df[FEATURES]
-    y_train = train_df[TARGET]
-    X_pred = pred_df[FEATURES]
+    X_train = as_model_input(train_df[FEATURES])
+    y_train = train_df[TARGET].to_numpy()
+    X_pred = as_model_input(pred_df[FEATURES])
 
     param_grid = {
         "n_estimators": [200, 300],
@@ -289,7 +439,10 @@ def _train_and_predict():
         "max_features": ["sqrt", "log2"]
     }
 
-    rf = RandomForestRegressor(random_state=42, n_jobs=-1)
+    # Random forest rather than HistGradientBoostingRegressor: on the few dozen complete training rows
+    # the best HGB search scored CV R² -0.197 (early stopping) / -0.014 (heavily regularized, no early
+    # stopping) against -0.013 for the forest
+    rf = RandomForestRegressor(random_state=42, n_jobs=1)
     search_rf = RandomizedSearchCV(
         rf,
         param_distributions=param_grid,
@@ -297,55 +450,34 @@ def _train_and_predict():
         scoring="r2",
         cv=3,
         random_state=42,
-        n_jobs=-1
+        n_jobs=N_JOBS
     )
 
-    search_rf.fit(X_train, y_train)
-    best_model_rf = search_rf.best_estimator_
+    search_rf = fit_search_cached(search_rf, X_train, y_train, "rf")
+    best_model = search_rf.best_estimator_
 
-    y_pred_2026 = best_model_rf.predict(X_pred)
+    y_pred_2026 = best_model.predict(X_pred)
     pred_df["predicted_impact_rebased_2026"] = y_pred_2026
 
-    train_df_temp = df[df["period"] <= 2023].copy()
-    
-    human_burden_components = train_df_temp[["log_total_affected", "log_total_death", "log_total_affected_3yr_avg", "log_total_death_3yr_avg"]].mean(axis=1)
-    human_burden_mean = human_burden_components.mean()
-    human_burden_std = human_burden_components.std() or 1
-    pred_df["human_burden"] = (pred_df[["log_total_affected", "log_total_death", "log_total_affected_3yr_avg", "log_total_death_3yr_avg"]].mean(axis=1) - human_burden_mean) / human_burden_std
-
-    persistence_train = train_df_temp[["impact_3yr_avg", "impact_lag1"]].mean(axis=1)
-    persistence_mean = persistence_train.mean()
-    persistence_std = persistence_train.std() or 1
-    pred_df["persistence"] = (pred_df[["impact_3yr_avg", "impact_lag1"]].mean(axis=1) - persistence_mean) / persistence_std
-
-    climate_intensity_mean = train_df_temp["climate_impact_index"].mean()
-    climate_intensity_std = train_df_temp["climate_impact_index"].std() or 1
-    pred_df["climate_intensity"] = (pred_df["climate_impact_index"] - climate_intensity_mean) / climate_intensity_std
-
-    structural_mean = train_df_temp["country_mean_impact"].mean()
-    structural_std = train_df_temp["country_mean_impact"].std() or 1
-    pred_df["structural_vulnerability"] = (pred_df["country_mean_impact"] - structural_mean) / structural_std
-
-    pred_df["CLI"] = (
-        0.50 * pred_df["human_burden"] +
-        0.25 * pred_df["persistence"] +
-        0.15 * pred_df["climate_intensity"] +
-        0.10 * pred_df["structural_vulnerability"]
-    )
+    standardize_cli(pred_df, stats)
 
     pred_df = filter_valid_countries(pred_df)
     pred_df = pred_df[pred_df["CLI"].notna()].copy()
 
     feature_importance = pd.DataFrame({
         'feature': FEATURES,
-        'importance': best_model_rf.feature_importances_
+        'importance': best_model.feature_importances_
     }).sort_values('importance', ascending=False)
 
     # Save predictions to CSV
     pred_df.to_csv('data/processed/predictions_2026.csv', index=False)
     feature_importance.to_csv('data/processed/feature_importance.csv', index=False)
     
-    return best_model_rf, pred_df, feature_importance, FEATURES
+    return best_model, pred_df, feature_importance, FEATURES
+
+
+def _train_and_predict():
+    return fit_predict(*load_features())
 
 
 def load_predictions():
@@ -363,6 +495,36 @@ def load_predictions():
     return pred_df, feature_importance, features
 
 
+def as_model_input(frame):
+    """
+    Feature frame as a float32 C-contiguous array, the layout tree models
+    split on, so the cast happens once instead of in every search fit.
+    """
+    return np.ascontiguousarray(frame.to_numpy(dtype=np.float32))
+
+
+def fit_search_cached(search, X, y, name, **fit_params):
+    """
+    Fit a hyperparameter search, or load the fitted search saved for the same
+    training data and search configuration. fit_params (e.g. an eval_set) are
+    passed to fit but not hashed, so they must be derived from the same data.
+    """
+    h = hashlib.md5()
+    for values in (X, y):
+        values = np.ascontiguousarray(values)
+        h.update(f"{values.dtype}{values.shape}".encode())
+        h.update(values.tobytes())
+    h.update(repr(search.get_params()).encode())
+    search_path = os.path.join(MODEL_CACHE_DIR, f"{h.hexdigest()}_{name}.joblib")
+    if os.path.exists(search_path):
+        return load(search_path)
+    
+    search.fit(X, y, **fit_params)
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    dump(search, search_path)
+    return search
+
+
 def train_and_predict(use_cache=True):
     """Train model and predict, using cached CSV if available"""
     cache_path = 'data/processed/predictions_2026.csv'